@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+The Ark Forensic Platform - Claude helper utilities
+Shared by claude-chat.py, claude-debug.py and test-api.py.
+
+claude-chat.py caches responses for 24 hours in ~/.ark/llm_cache.sqlite3
+(owner-only, expired entries purged on open); run it with --no-cache to
+bypass the cache. The two connection tests never use it.
+"""
+
+import atexit
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+API_URL = "https://api.anthropic.com/v1/messages"
+API_VERSION = "2023-06-01"
+
+CACHE_PATH = Path.home() / ".ark" / "llm_cache.sqlite3"
+CACHE_TTL = 86400  # 24 hours
+
+# claude-chat.py --no-cache always hits the API (read from argv at import)
+NO_CACHE = "--no-cache" in sys.argv[1:]
+
+# HTTP/2 lets concurrent calls share one TLS connection; needs the h2 package (httpx[http2])
+HTTP2 = importlib.util.find_spec("h2") is not None
+HTTP_LIMITS = dict(max_keepalive_connections=4, max_connections=10)
+
+_db = None
+
+def _warn_no_http2():
+    if not HTTP2:
+        print("⚠️  h2 is not installed, falling back to HTTP/1.1: pip install -r requirements.txt",
+              file=sys.stderr)
+
+def http2_client():
+    """The SDK's default httpx client for anthropic.Anthropic, with HTTP/2 and our pool limits"""
+    import anthropic
+    import httpx
+    _warn_no_http2()
+    return anthropic.DefaultHttpxClient(http2=HTTP2, limits=httpx.Limits(**HTTP_LIMITS))
+
+def async_http2_client():
+    """The SDK's default httpx client for anthropic.AsyncAnthropic, with HTTP/2 and our pool limits"""
+    import anthropic
+    import httpx
+    _warn_no_http2()
+    return anthropic.DefaultAsyncHttpxClient(http2=HTTP2, limits=httpx.Limits(**HTTP_LIMITS))
+
+@functools.lru_cache(maxsize=1)
+def api_key():
+    """ANTHROPIC_API_KEY from the environment, read once (call api_key.cache_clear() after setting it)"""
+    return os.getenv("ANTHROPIC_API_KEY")
+
+@functools.lru_cache(maxsize=1)
+def client():
+    """Shared anthropic.Anthropic client"""
+    import anthropic
+    return anthropic.Anthropic(api_key=api_key(), http_client=http2_client())
+
+def async_client():
+    """New anthropic.AsyncAnthropic client; close it (async with) before its event loop ends"""
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=api_key(), http_client=async_http2_client())
+
+@functools.lru_cache(maxsize=1)
+def session():
+    """Shared keep-alive requests.Session for direct calls to the REST API"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Retry transient failures on the pooled connection rather than in an outer loop
+    retry = Retry(
+        total=3,
+        read=0,  # a POST that timed out mid-generation may still be billed; don't resend it
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(["POST", "GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False  # hand back the last error response once retries run out
+    )
+
+    s = requests.Session()
+    s.headers.update({
+        "x-api-key": api_key(),
+        "content-type": "application/json",
+        "anthropic-version": API_VERSION
+    })
+    s.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry))
+    atexit.register(s.close)
+    return s
+
+def post_messages(payload, timeout=30):
+    """POST payload to the Messages REST endpoint over the shared session"""
+    return session().post(API_URL, json=payload, timeout=timeout)
+
+def _cache_db():
+    """Open (and create if needed) the on-disk response cache, dropping expired entries"""
+    global _db
+    if _db is None:
+        # Cached chat turns are investigator transcripts: keep them owner-only
+        CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        os.close(os.open(CACHE_PATH, os.O_CREAT | os.O_WRONLY, 0o600))
+        os.chmod(CACHE_PATH, 0o600)
+        db = sqlite3.connect(str(CACHE_PATH))
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+        db.commit()
+        _db = db
+    return _db
+
+def cache_key(**request):
+    """Hash the request parameters (model, max_tokens, messages, ...) into a cache key"""
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cache_get(key):
+    """Return the cached JSON string for key, or None if missing or expired"""
+    if NO_CACHE:
+        return None
+    try:
+        row = _cache_db().execute(
+            "SELECT value FROM responses WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+    except (sqlite3.Error, OSError):
+        return None
+    return row[0] if row else None
+
+def cache_set(key, value, expire=CACHE_TTL):
+    """Store a JSON string under key for expire seconds"""
+    if NO_CACHE:
+        return
+    try:
+        db = _cache_db()
+        db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + expire)
+        )
+        db.commit()
+    except (sqlite3.Error, OSError):
+        pass
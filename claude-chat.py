@@ -1,44 +1,149 @@
 #!/usr/bin/env python3
+import importlib.util
 import os
+import select
 import sys
 
-try:
-    import anthropic
-except ImportError:
-    print("Installing anthropic...")
-    os.system("pip3 install anthropic --break-system-packages")
-    import anthropic
+if importlib.util.find_spec("anthropic") is None:
+    sys.exit("❌ anthropic is not installed: pip install -r requirements.txt")
+
+import anthropic
+
+from ark_llm import api_key, cache_get, cache_key, cache_set, client
+
+MODEL = "claude-3-5-sonnet-20241022"
+
+# Kept identical across turns so Anthropic's prompt cache can serve it
+SYSTEM_PROMPT = (
+    "You are Claude, assisting an investigator working on The Ark forensic "
+    "platform. Answer clearly and concisely."
+)
+SYSTEM = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
+# Rough chars-per-token estimate; the API won't cache prefixes under 1024 tokens
+CACHE_MIN_TOKENS = 1024
+CHARS_PER_TOKEN = 4
+
+def build_messages(history):
+    """Return history for the request, marking the growing prefix as cacheable once it is large enough"""
+    if sum(len(m["content"]) for m in history) // CHARS_PER_TOKEN < CACHE_MIN_TOKENS:
+        return history
+    *earlier, last = history
+    return earlier + [{
+        "role": last["role"],
+        "content": [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+    }]
+
+def message_text(message):
+    """Join the text blocks of a response"""
+    return "".join(block.text for block in message.content if block.type == "text")
+
+# Lines arriving within this window of each other (pastes, rapid follow-ups) go out as one request
+BATCH_WINDOW = 0.25
+BATCH_MAX_LINES = 8
+
+EXIT_COMMANDS = ('exit', 'quit')
+
+def is_exit(line):
+    """True if line is an exit/quit command (batching stops there)"""
+    return line.strip().lower() in EXIT_COMMANDS
+
+def read_batched(prompt, timeout=BATCH_WINDOW, max_lines=BATCH_MAX_LINES):
+    """Read one line of input, plus any that follow within timeout seconds; returns (text, exit_requested)"""
+    first = input(prompt)
+    if is_exit(first):
+        return "", True
+    if not first.strip():
+        return "", False
+    
+    lines = [first]
+    exit_requested = False
+    try:
+        while len(lines) < max_lines:
+            ready, _, _ = select.select([sys.stdin], [], [], timeout)
+            if not ready:
+                break
+            line = sys.stdin.readline()
+            if not line:
+                break
+            if is_exit(line):
+                exit_requested = True
+                break
+            lines.append(line.rstrip("\n"))  # blank lines inside a paste are kept
+    except (OSError, ValueError):
+        pass  # stdin can't be polled (e.g. Windows console); send the first line alone
+    
+    while not lines[-1].strip():
+        lines.pop()
+    if len(lines) == 1:
+        return lines[0], exit_requested
+    # Joined verbatim so pasted code and paragraphs arrive intact
+    print(f"(📨 batching {len(lines)} lines into one request)")
+    return "These lines were sent together; answer all of them:\n\n" + "\n".join(lines), exit_requested
 
 def main():
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    if not api_key:
+    if not api_key():
         print("🔑 Please set your API key:")
         print("export ANTHROPIC_API_KEY='your-key-here'")
-        api_key = input("Enter your API key: ").strip()
-        if api_key:
-            os.environ['ANTHROPIC_API_KEY'] = api_key
+        entered_key = input("Enter your API key: ").strip()
+        if entered_key:
+            os.environ['ANTHROPIC_API_KEY'] = entered_key
+            api_key.cache_clear()
         else:
             return
     
-    client = anthropic.Anthropic(api_key=api_key)
     print("🤖 Claude Chat Ready!")
     print("Type 'exit' to quit")
     print("-" * 30)
     
+    history = []
+    
     while True:
         try:
-            user_input = input("\nYou: ")
-            if user_input.lower() in ['exit', 'quit']:
-                break
+            user_input, exit_requested = read_batched("\nYou: ")
             if not user_input.strip():
+                if exit_requested:
+                    break
                 continue
-                
-            response = client.messages.create(
-                model="claude-3-5-sonnet-20241022",
+            
+            history.append({"role": "user", "content": user_input})
+            request = dict(
+                model=MODEL,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": user_input}]
+                system=SYSTEM,
+                messages=build_messages(history)
             )
-            print(f"\nClaude: {response.content[0].text}")
+            key = cache_key(**request)
+            hit = cache_get(key)
+            
+            print("\nClaude: ", end="", flush=True)
+            if hit is not None:
+                message = anthropic.types.Message.model_validate_json(hit)
+                print(message_text(message))
+            else:
+                try:
+                    with client().messages.stream(**request) as stream:
+                        for text in stream.text_stream:
+                            print(text, end="", flush=True)
+                        message = stream.get_final_message()
+                    print()
+                except KeyboardInterrupt:
+                    # Ctrl+C mid-response stops this answer, not the chat
+                    history.pop()
+                    print("\n[response interrupted]")
+                    if exit_requested:
+                        break
+                    continue
+                cache_set(key, message.model_dump_json())
+                
+                # Only a live response's usage describes this turn's prompt cache reads
+                cached = getattr(message.usage, "cache_read_input_tokens", None)
+                if cached:
+                    print(f"(📦 {cached} prompt tokens served from cache)")
+            
+            history.append({"role": "assistant", "content": message_text(message)})
+            if exit_requested:
+                break
             
         except KeyboardInterrupt:
             break
@@ -1,53 +1,68 @@
 #!/usr/bin/env python3
-import os
+import asyncio
+import importlib.util
 import sys
 
-try:
-    import anthropic
-except ImportError:
-    print("Installing anthropic...")
-    os.system("pip3 install anthropic --break-system-packages")
-    import anthropic
+if importlib.util.find_spec("anthropic") is None:
+    sys.exit("❌ anthropic is not installed: pip install -r requirements.txt")
+
+from ark_llm import api_key, async_client
+
+MODELS = ("claude-3-5-sonnet-20241022", "claude-3-haiku-20240307")
+
+async def probe(client, model):
+    """Send the test prompt to a single model (never cached: this is a connection test)"""
+    return await client.messages.create(
+        model=model,
+        max_tokens=50,
+        messages=[{"role": "user", "content": "Say 'Hello' briefly"}]
+    )
+
+async def probe_models(client):
+    """Probe all models concurrently; return (model, response) for the first in MODELS that works"""
+    # Every probe starts now, but results are taken in preference order so a
+    # fast fallback never hides a failure of the model claude-chat.py uses
+    tasks = [asyncio.create_task(probe(client, model)) for model in MODELS]
+    try:
+        for model, task in zip(MODELS, tasks):
+            try:
+                return model, await task
+            except Exception as e:
+                print(f"❌ {model} failed: {type(e).__name__}: {str(e)}")
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
 
 def test_connection():
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    if not api_key:
+    key = api_key()
+    if not key:
         print("❌ No API key found")
         return False
     
-    print(f"🔑 API Key: {api_key[:20]}...{api_key[-10:]}")
+    print(f"🔑 API Key: {key[:20]}...{key[-10:]}")
+    
+    async def run():
+        async with async_client() as client:
+            print("✅ Client created successfully")
+            
+            # Test all models at once instead of falling back one by one
+            print(f"🧪 Testing API call ({', '.join(MODELS)})...")
+            return await probe_models(client)
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
-        print("✅ Client created successfully")
-        
-        # Test with a simple message
-        print("🧪 Testing API call...")
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=50,
-            messages=[{"role": "user", "content": "Say 'Hello' briefly"}]
-        )
-        print(f"✅ Success: {response.content[0].text}")
-        return True
-        
+        result = asyncio.run(run())
     except Exception as e:
         print(f"❌ Error details: {type(e).__name__}: {str(e)}")
-        
-        # Try with older model
-        try:
-            print("🔄 Trying with claude-3-haiku...")
-            response = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=50,
-                messages=[{"role": "user", "content": "Say 'Hello' briefly"}]
-            )
-            print(f"✅ Haiku works: {response.content[0].text}")
-            return True
-        except Exception as e2:
-            print(f"❌ Haiku also failed: {type(e2).__name__}: {str(e2)}")
-        
         return False
+    
+    if result is None:
+        print("❌ All models failed")
+        return False
+    
+    model, response = result
+    print(f"✅ {model} works: {response.content[0].text}")
+    return True
 
 if __name__ == "__main__":
     print("🔍 Claude Connection Debug")
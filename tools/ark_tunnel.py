@@ -8,14 +8,26 @@ import subprocess
 import time
 import threading
 import signal
+import socket
 import sys
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared keep-alive session for the service health checks
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_maxsize=8))
+
 class ArkTunnel:
     def __init__(self):
-        self.tunnels = []
-        self.processes = []
+        self.tunnels = []  # local ports currently forwarded through the master
+        self.master = None  # the single ssh -M process carrying every tunnel
+        self.lock = threading.Lock()  # guards self.tunnels across tunnel threads
+        self.restart_queue = queue.Queue()  # signalled when the master connection exits
         self.running = False
         
         # Vast.ai instance configuration
@@ -23,25 +35,143 @@ class ArkTunnel:
         self.ssh_port = "51414"  # Your Vast.ai SSH port
         self.user = "root"
         
-        # Service mappings (local_port -> remote_port)
+        # Service mappings (local_port -> remote_port). "health" is the path test_services
+        # requests (default "/"); "detail" builds an extra status line from its JSON response
         self.services = {
             8080: {"remote": 8080, "name": "Frontend (The Ark UI)", "url": "http://localhost:8080"},
-            8001: {"remote": 8001, "name": "Backend API", "url": "http://localhost:8001"},
-            8434: {"remote": 8434, "name": "Ollama AI API", "url": "http://localhost:8434/api/tags"},
+            8001: {"remote": 8001, "name": "Backend API", "url": "http://localhost:8001",
+                   "health": "/health",
+                   "detail": lambda data: f"💾 Database: {data.get('database', 'unknown')}"},
+            8434: {"remote": 8434, "name": "Ollama AI API", "url": "http://localhost:8434/api/tags",
+                   "health": "/api/tags",
+                   "detail": lambda data: f"🤖 {len(data.get('models', []))} AI models loaded"},
         }
+        # (local_port, remote_port, name) per service, unpacked on every (re)connect
+        self.tunnel_specs = [
+            (local_port, config["remote"], config["name"])
+            for local_port, config in self.services.items()
+        ]
+        
+        # SSH connection multiplexing: one master connection owns the control
+        # socket and tunnels are added to it with "ssh -O forward".
+        # %C hashes the connection so the path stays under the sun_path limit.
+        self.ctl_dir = Path.home() / ".ark" / "ssh"
+        self.ctl_dir.mkdir(parents=True, exist_ok=True)
+        self.ctl_path = f"{self.ctl_dir}/cm-%C"
+        self.mux_opts = ["-o", f"ControlPath={self.ctl_path}"]
+        self.log_path = self.ctl_dir / "master.log"  # ssh master stderr
+        
+        # ssh argv pieces built once; every invocation shares the same options
+        self.destination = f"{self.user}@{self.host}"
+        self.ssh_opts = [*self.mux_opts, "-p", self.ssh_port]
+        self.master_cmd = [
+            "ssh", "-M", "-N", *self.ssh_opts,
+            "-o", "BatchMode=yes",
+            "-o", "ConnectTimeout=5",
+            "-o", "ServerAliveInterval=30",
+            "-o", "ServerAliveCountMax=3",
+            "-o", "ExitOnForwardFailure=yes",
+            self.destination
+        ]
+        
+    def cleanup_stale_sockets(self):
+        """Remove control sockets left behind by a master that is no longer running"""
+        for sock_path in self.ctl_dir.glob("cm-*"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(str(sock_path))
+            except OSError:
+                try:
+                    os.unlink(sock_path)
+                except OSError:
+                    pass
+            finally:
+                sock.close()
+
+    def ssh_control(self, command, *args):
+        """Send a control command (check, forward, exit) to the master connection"""
+        return subprocess.run(
+            ["ssh", "-O", command, *args, *self.ssh_opts, self.destination],
+            capture_output=True, text=True, timeout=5
+        )
+
+    def master_running(self):
+        """True if a master connection answers on the control socket"""
+        try:
+            return self.ssh_control("check").returncode == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+    def start_master(self):
+        """Start the shared master connection; returns an error message or None on success"""
+        # A master that was killed outright leaves its socket behind, and a new
+        # master would then run without one ("ControlSocket ... already exists")
+        self.cleanup_stale_sockets()
+        
+        # A live master on our ControlPath belongs to another run; leave it alone
+        if self.master_running():
+            return f"an SSH master for {self.destination} is already running (another ark_tunnel.py?)"
         
+        # stderr goes to a file rather than a pipe: nobody drains a pipe while
+        # the master runs, and once it fills ssh would block on its next write
+        self.rotate_log()
+        with open(self.log_path, "ab") as log:
+            log_start = log.tell()
+            # Own session: a terminal Ctrl+C must not kill the master before
+            # signal_handler stops monitoring, or it would be reconnected
+            process = subprocess.Popen(
+                self.master_cmd, stdout=subprocess.DEVNULL, stderr=log, start_new_session=True
+            )
+        # Tracked straight away so stop_master can kill it even mid-handshake;
+        # in its own session nothing else would stop it
+        self.master = process
+        
+        # The master is ready once it answers on the control socket
+        try:
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                if process.poll() is not None:
+                    self.master = None
+                    return self.read_log(log_start) or f"ssh exited with code {process.returncode}"
+                if self.master_running():
+                    threading.Thread(target=self.watch_master, args=(process,), daemon=True).start()
+                    return None
+                time.sleep(0.2)
+        except Exception:
+            process.kill()
+            self.master = None
+            raise
+        
+        process.kill()
+        self.master = None
+        return "timed out waiting for the SSH master connection"
+
+    def rotate_log(self, max_bytes=1024 * 1024):
+        """Keep one previous master log once the current one grows past max_bytes"""
+        try:
+            if self.log_path.stat().st_size > max_bytes:
+                os.replace(self.log_path, self.log_path.with_suffix(".log.1"))
+        except OSError:
+            pass
+
+    def read_log(self, offset):
+        """Return what ssh wrote to the master log after offset"""
+        try:
+            with open(self.log_path, "rb") as log:
+                log.seek(offset)
+                return log.read().decode(errors="replace").strip()
+        except OSError:
+            return ""
+
     def check_ssh_key(self):
-        """Check if SSH key exists or connection works"""
+        """Check SSH access by opening the shared master connection"""
         try:
-            result = subprocess.run([
-                "ssh", "-o", "BatchMode=yes", "-o", "ConnectTimeout=5",
-                "-p", self.ssh_port, f"{self.user}@{self.host}", "echo 'Connected'"
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
+            error = self.start_master()
+            if error is None:
                 return True
             else:
-                print("❌ SSH connection failed. You may need to:")
+                print(f"❌ SSH connection failed: {error}")
+                print("   You may need to:")
                 print(f"   1. Add your SSH key to the Vast.ai instance")
                 print(f"   2. Or use password authentication")
                 print(f"   3. Verify the SSH port ({self.ssh_port}) is correct")
@@ -50,36 +180,50 @@ class ArkTunnel:
             print(f"❌ SSH check failed: {e}")
             return False
 
+    def wait_for_port(self, local_port, timeout=3):
+        """Return True as soon as the local end of a tunnel accepts connections"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.master is None or self.master.poll() is not None:
+                return False
+            try:
+                socket.create_connection(("127.0.0.1", local_port), timeout=0.1).close()
+                return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+
     def create_tunnel(self, local_port, remote_port, service_name):
-        """Create a single SSH tunnel"""
+        """Add a single port forward to the master connection"""
         try:
-            cmd = [
-                "ssh", "-N", "-L", f"{local_port}:localhost:{remote_port}",
-                "-p", self.ssh_port, f"{self.user}@{self.host}",
-                "-o", "ServerAliveInterval=30",
-                "-o", "ServerAliveCountMax=3",
-                "-o", "ExitOnForwardFailure=yes"
-            ]
-            
             print(f"🔗 Creating tunnel for {service_name}: localhost:{local_port} -> {self.host}:{remote_port}")
             
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            self.processes.append(process)
+            result = self.ssh_control("forward", "-L", f"{local_port}:localhost:{remote_port}")
+            if result.returncode != 0:
+                print(f"❌ Failed to create tunnel for {service_name}: {result.stderr.strip()}")
+                return False
             
-            # Wait a moment to check if tunnel started successfully
-            time.sleep(2)
-            if process.poll() is None:
-                print(f"✅ {service_name} tunnel active on port {local_port}")
-                return True
-            else:
-                stdout, stderr = process.communicate()
-                print(f"❌ Failed to create tunnel for {service_name}: {stderr.decode()}")
+            # Confirm the forward is actually listening instead of assuming it is
+            if not self.wait_for_port(local_port):
+                print(f"❌ Tunnel for {service_name} is not accepting connections on port {local_port}")
                 return False
+            
+            with self.lock:
+                self.tunnels.append(local_port)
+            print(f"✅ {service_name} tunnel active on port {local_port}")
+            return True
                 
         except Exception as e:
             print(f"❌ Error creating tunnel for {service_name}: {e}")
             return False
 
+    def create_all_tunnels(self):
+        """Forward every service through the master; returns the number of tunnels created"""
+        # Forwards are independent requests to the same master, so send them together
+        with ThreadPoolExecutor(max_workers=len(self.tunnel_specs)) as executor:
+            results = list(executor.map(lambda spec: self.create_tunnel(*spec), self.tunnel_specs))
+        return sum(results)
+
     def start_tunnels(self):
         """Start all SSH tunnels"""
         print("🚀 Starting The Ark Forensic Platform SSH Tunnels")
@@ -87,27 +231,28 @@ class ArkTunnel:
         print(f"📡 Connecting to Vast.ai instance: {self.host}:{self.ssh_port}")
         print()
         
+        if self.master_running():
+            print("❌ Tunnels are already running (another ark_tunnel.py owns the SSH master)")
+            print(f"   Stop that one first, or run: ssh -O exit {' '.join(self.ssh_opts)} {self.destination}")
+            return False
+        
         if not self.check_ssh_key():
             print("\n💡 To fix SSH access:")
-            print(f"   ssh-copy-id -p {self.ssh_port} {self.user}@{self.host}")
+            print(f"   ssh-copy-id -p {self.ssh_port} {self.destination}")
             print("   Or manually add your public key to ~/.ssh/authorized_keys")
             return False
         
         print("✅ SSH connection verified\n")
         
         self.running = True
-        success_count = 0
-        
-        for local_port, config in self.services.items():
-            if self.create_tunnel(local_port, config["remote"], config["name"]):
-                success_count += 1
+        success_count = self.create_all_tunnels()
         
         if success_count > 0:
             print()
             print("🎉 Tunnels Active! Access your services:")
             print("=" * 50)
             for local_port, config in self.services.items():
-                if any(p.poll() is None for p in self.processes):
+                if local_port in self.tunnels:
                     print(f"🌐 {config['name']}: {config['url']}")
             
             print()
@@ -123,83 +268,108 @@ class ArkTunnel:
             print("❌ No tunnels could be established")
             return False
 
+    def watch_master(self, process):
+        """Block until the master connection exits, then signal a reconnect"""
+        process.wait()
+        with self.lock:
+            self.tunnels.clear()
+        if self.running:
+            self.restart_queue.put(process)
+
     def monitor_tunnels(self):
-        """Monitor tunnel health and restart if needed"""
+        """Reconnect the master and restore its tunnels whenever it dies"""
         while self.running:
+            process = self.restart_queue.get()
+            if process is None or not self.running:
+                break
             try:
-                # Check if any processes have died
-                for i, process in enumerate(self.processes):
-                    if process.poll() is not None:
-                        local_port = list(self.services.keys())[i]
-                        service_name = self.services[local_port]["name"]
-                        print(f"⚠️  Tunnel for {service_name} died, restarting...")
-                        
-                        # Remove dead process
-                        self.processes.remove(process)
-                        
-                        # Recreate tunnel
-                        self.create_tunnel(local_port, self.services[local_port]["remote"], service_name)
+                print("⚠️  SSH connection died, reconnecting...")
                 
-                time.sleep(10)  # Check every 10 seconds
-            except KeyboardInterrupt:
-                break
+                error = self.start_master()
+                if error is None:
+                    self.create_all_tunnels()
+                else:
+                    print(f"❌ Reconnect failed: {error}")
+                    time.sleep(5)  # Back off before the next attempt
+                    self.restart_queue.put(process)
             except Exception as e:
                 print(f"❌ Monitor error: {e}")
                 time.sleep(5)
+                self.restart_queue.put(process)
 
     def stop_tunnels(self):
         """Stop all SSH tunnels"""
         print("\n🛑 Stopping tunnels...")
         self.running = False
+        self.restart_queue.put(None)  # Wake the monitor so it can exit
         
-        for process in self.processes:
-            try:
-                process.terminate()
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                process.kill()
-            except Exception as e:
-                print(f"Error stopping process: {e}")
-        
-        self.processes.clear()
+        self.stop_master()
+        with self.lock:
+            self.tunnels.clear()
         print("✅ All tunnels stopped")
 
+    def stop_master(self):
+        """Shut down the SSH master connection started by this process"""
+        # Only our own master: -O exit would also stop another run's tunnels
+        master, self.master = self.master, None
+        if master is None:
+            return
+        
+        try:
+            self.ssh_control("exit")
+        except Exception as e:
+            print(f"Error stopping SSH master: {e}")
+        
+        # A master that never became ready has no socket for -O exit to reach
+        if master.poll() is None:
+            master.terminate()
+        try:
+            master.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+    def check_service(self, local_port, config):
+        """Request a service's health endpoint; returns (config, status, detail line or None)"""
+        url = f"http://localhost:{local_port}{config.get('health', '/')}"
+        response = session.get(url, timeout=5)
+        
+        detail = None
+        if response.status_code == 200 and "detail" in config:
+            try:
+                detail = config["detail"](response.json())
+            except ValueError:
+                detail = "⚠️  Response was not JSON"
+            except (AttributeError, TypeError):
+                detail = "⚠️  Unexpected JSON response"
+        return config, response.status_code, detail
+
     def test_services(self):
         """Test if services are accessible through tunnels"""
         print("🔍 Testing service accessibility...")
         
-        import urllib.request
-        import json
-        
-        for local_port, config in self.services.items():
-            try:
-                if local_port == 8434:  # Ollama API
-                    url = f"http://localhost:{local_port}/api/tags"
-                elif local_port == 8001:  # Backend API
-                    url = f"http://localhost:{local_port}/health"
-                else:  # Frontend
-                    url = f"http://localhost:{local_port}"
-                
-                response = urllib.request.urlopen(url, timeout=5)
-                if response.getcode() == 200:
-                    print(f"✅ {config['name']}: OK")
-                    
-                    # Show additional info for API endpoints
-                    if local_port == 8434:
-                        data = json.loads(response.read())
-                        model_count = len(data.get('models', []))
-                        print(f"   🤖 {model_count} AI models loaded")
-                    elif local_port == 8001:
-                        data = json.loads(response.read())
-                        print(f"   💾 Database: {data.get('database', 'unknown')}")
-                else:
-                    print(f"❌ {config['name']}: HTTP {response.getcode()}")
-                    
-            except Exception as e:
-                print(f"❌ {config['name']}: {e}")
+        with ThreadPoolExecutor(max_workers=len(self.services)) as executor:
+            futures = {
+                executor.submit(self.check_service, local_port, config): config
+                for local_port, config in self.services.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    config, status, detail = future.result()
+                    if status == 200:
+                        print(f"✅ {config['name']}: OK")
+                        if detail:
+                            print(f"   {detail}")
+                    else:
+                        print(f"❌ {config['name']}: HTTP {status}")
+                        
+                except Exception as e:
+                    print(f"❌ {futures[future]['name']}: {e}")
 
     def signal_handler(self, signum, frame):
-        """Handle Ctrl+C gracefully"""
+        """Handle Ctrl+C, SIGTERM and SIGHUP gracefully"""
+        if signum == getattr(signal, "SIGHUP", None):
+            # The terminal is gone; printing to it would fail before cleanup
+            sys.stdout = sys.stderr = open(os.devnull, "w")
         print("\n🛑 Received interrupt signal...")
         self.stop_tunnels()
         sys.exit(0)
@@ -207,8 +377,11 @@ class ArkTunnel:
 def main():
     tunnel_manager = ArkTunnel()
     
-    # Handle Ctrl+C
-    signal.signal(signal.SIGINT, tunnel_manager.signal_handler)
+    # Handle Ctrl+C, kill and a closed terminal: the master runs in its own
+    # session, so it would otherwise outlive this script
+    for signame in ("SIGINT", "SIGTERM", "SIGHUP"):
+        if hasattr(signal, signame):
+            signal.signal(getattr(signal, signame), tunnel_manager.signal_handler)
     
     try:
         if tunnel_manager.start_tunnels():
@@ -216,9 +389,6 @@ def main():
             monitor_thread = threading.Thread(target=tunnel_manager.monitor_tunnels, daemon=True)
             monitor_thread.start()
             
-            # Wait a moment for tunnels to establish
-            time.sleep(3)
-            
             # Test services
             tunnel_manager.test_services()
             